@@ -2,6 +2,7 @@
 # Licensed under the MIT License.
 
 import sys
+import time
 from datetime import datetime
 from http import HTTPStatus
 from aiohttp import web
@@ -17,11 +18,13 @@ from botbuilder.core.integration import aiohttp_error_middleware
 from botbuilder.schema import Activity, ActivityTypes
 
 from bots import AuthBot
+from client.scheduler import FairScheduler
 import logging
 import traceback
 
 # Create the loop and Flask app
 from config import DefaultConfig
+from diagnostics import AdminRoutes, TrafficRecorder, TrafficRecorderMiddleware
 from dialogs import MainDialog
 
 CONFIG = DefaultConfig()
@@ -61,17 +64,33 @@ async def on_error(context: TurnContext, error: Exception):
 # Assign the global error handler to the adapter
 ADAPTER.on_turn_error = on_error
 
+# Capture traffic for replay when a capture path is configured
+RECORDER = None
+if CONFIG.TRAFFIC_CAPTURE_PATH:
+    RECORDER = TrafficRecorder(CONFIG.TRAFFIC_CAPTURE_PATH,
+                               CONFIG.TRAFFIC_CAPTURE_MAX_BYTES,
+                               CONFIG.TRAFFIC_CAPTURE_BACKUPS)
+    ADAPTER.use(TrafficRecorderMiddleware(RECORDER))
+
 # Create MemoryStorage and state management objects
 MEMORY = MemoryStorage()
 USER_STATE = UserState(MEMORY)
 CONVERSATION_STATE = ConversationState(MEMORY)
 
+# Create the scheduler that shares outbound Databricks calls fairly across tenants and users
+SCHEDULER = FairScheduler(CONFIG.SCHEDULER_MAX_CONCURRENCY,
+                          FairScheduler.parse_weights(CONFIG.SCHEDULER_TENANT_WEIGHTS),
+                          FairScheduler.parse_weights(CONFIG.SCHEDULER_USER_WEIGHTS),
+                          FairScheduler.parse_weights(CONFIG.SCHEDULER_CLASS_WEIGHTS))
+
 # Create dialog instance
 DIALOG = MainDialog(CONFIG.CONNECTION_NAME,
                     CONFIG.DATABRICKS_HOST,
                     CONFIG.SERVING_ENDPOINT_NAME,
                     USER_STATE,
-                    CONVERSATION_STATE)
+                    CONVERSATION_STATE,
+                    SCHEDULER,
+                    RECORDER)
 
 # Create the main bot instance
 BOT = AuthBot(CONVERSATION_STATE, USER_STATE, DIALOG)
@@ -91,6 +110,10 @@ async def messages(req: Request) -> Response:
     logging.info(f"Incoming activity type: {activity.type}")
     logging.info(f"Activity name: {getattr(activity, 'name', None)}")
 
+    started = time.monotonic()
+    if RECORDER:
+        RECORDER.record("incoming", activity_id=activity.id, activity=body)
+
     try:
         # Process activity with the bot adapter and bot logic
         response = await ADAPTER.process(req, BOT)
@@ -101,12 +124,24 @@ async def messages(req: Request) -> Response:
         logging.info(f"Response output: {response}")
         logging.info(f"Response body output: {response.body}")
 
+        if RECORDER:
+            RECORDER.record("incoming_done",
+                            activity_id=activity.id,
+                            status=response.status if response else None,
+                            duration_seconds=time.monotonic() - started)
+
         return response
 
     except Exception as e:
         # Log unexpected errors during activity processing
         logging.error(f"Exception in processing activity: {e}")
         traceback.print_exc()
+        if RECORDER:
+            RECORDER.record("incoming_done",
+                            activity_id=activity.id,
+                            status=HTTPStatus.INTERNAL_SERVER_ERROR.value,
+                            duration_seconds=time.monotonic() - started,
+                            error=str(e))
         return Response(
             status=HTTPStatus.INTERNAL_SERVER_ERROR,
             text="Internal server error while processing the activity."
@@ -117,6 +152,13 @@ async def messages(req: Request) -> Response:
 APP = web.Application(middlewares=[aiohttp_error_middleware])
 APP.router.add_post("/api/messages", messages)
 
+# Register admin-only diagnostics routes when an admin token is configured
+if CONFIG.ADMIN_TOKEN:
+    AdminRoutes(CONFIG.ADMIN_TOKEN,
+                MEMORY,
+                {"endpoint_warmer": DIALOG.endpoint_warmer.metrics,
+                 "scheduler": SCHEDULER.metrics}).register(APP)
+
 # Run aiohttp web server
 if __name__ == "__main__":
     try:
@@ -26,6 +26,7 @@ class AuthBot(DialogBot):
         self, members_added: List[ChannelAccount], turn_context: TurnContext
     ):
         # Handles new members added to the conversation and sends a welcome message.
+        self.warm_up_endpoint(turn_context)
         for member in members_added:
             # Greet anyone that was not the target (recipient) of this message.
             # To learn more about Adaptive Cards, see https://aka.ms/msbot-adaptivecards for more details.
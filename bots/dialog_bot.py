@@ -30,6 +30,11 @@ class DialogBot(TeamsActivityHandler):
         self.user_state = user_state
         self.dialog = dialog
 
+    def warm_up_endpoint(self, turn_context: TurnContext):
+        # Signals that a user is about to chat so the dialog can warm up its serving endpoint.
+        if hasattr(self.dialog, "warm_up_endpoint"):
+            self.dialog.warm_up_endpoint(turn_context)
+
     async def on_turn(self, turn_context: TurnContext):
         # Handles every turn of the bot and saves any state changes.
         try:
@@ -90,6 +95,7 @@ class DialogBot(TeamsActivityHandler):
                     turn_context,
                     self.conversation_state.create_property("DialogState"),
                 )
+                self.warm_up_endpoint(turn_context)
                 return InvokeResponse(status=200)
     
             elif turn_context.activity.name == "signin/verifyState":
@@ -100,6 +106,7 @@ class DialogBot(TeamsActivityHandler):
                     turn_context,
                     self.conversation_state.create_property("DialogState"),
                 )
+                self.warm_up_endpoint(turn_context)
     
                 return InvokeResponse(status=200)
     
@@ -0,0 +1,7 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+from .card_renderer import CardRenderer
+from .result_cursor import ResultCursorStore
+
+__all__ = ["CardRenderer", "ResultCursorStore"]
@@ -0,0 +1,263 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import json
+import logging
+
+from .result_cursor import ResultCursorStore
+from .templates import TOOL_CALL_CARD, TABLE_PAGE_CARD, NEXT_PAGE_ACTION, instantiate
+
+# Teams rejects messages above ~28KB; leave headroom for the activity envelope.
+DEFAULT_MAX_CARD_BYTES = 24000
+# Cells are not shortened below this; wider tables are split into bands of columns instead.
+MIN_CELL_CHARS = 20
+
+
+class CardRenderer:
+    """Renders Adaptive Cards for tool calls and paged tabular results."""
+
+    PAGE_ACTION = "result_page"
+
+    def __init__(self,
+                 cursor_store: ResultCursorStore = None,
+                 rows_per_page: int = 10,
+                 max_card_bytes: int = DEFAULT_MAX_CARD_BYTES,
+                 max_cell_chars: int = 500):
+        self.cursor_store = cursor_store if cursor_store is not None else ResultCursorStore()
+        self.rows_per_page = rows_per_page
+        self.max_card_bytes = max_card_bytes
+        self.max_cell_chars = max_cell_chars
+
+    def render_tool_call_card(self, tool_call_info: dict) -> dict:
+        card = instantiate(TOOL_CALL_CARD)
+        card["body"][1]["facts"] = [{"title": "Tool", "value": str(tool_call_info["name"])},
+                                    {"title": "Params", "value": str(tool_call_info["arguments"])},
+                                    {"title": "Result", "value": str(tool_call_info["output"])}]
+
+        # Keep the card under the payload limit. Facts that fit an equal share of the space left by
+        # the card's markup keep their full value; the larger ones split what the smaller ones leave.
+        facts = card["body"][1]["facts"]
+        values = [fact["value"] for fact in facts]
+        for fact in facts:
+            fact["value"] = ""
+        remaining = self.max_card_bytes - self._card_size(card)
+        by_size = sorted(zip(facts, values), key=lambda item: self._card_size(item[1]))
+        for index, (fact, value) in enumerate(by_size):
+            fact["value"] = self._shrink_to_bytes(value, remaining // (len(by_size) - index))
+            remaining -= self._card_size(fact["value"])
+
+        # Rounding can leave the card a few bytes over; the result gives them back.
+        result_fact = facts[2]
+        overflow = self._card_size(card) - self.max_card_bytes
+        if overflow > 0:
+            result_fact["value"] = self._shrink_to_bytes(result_fact["value"],
+                                                         self._card_size(result_fact["value"]) - overflow)
+        return card
+
+    def render_table(self, conversation_id: str, title: str, columns: list, rows: list) -> dict:
+        """Renders the first page of a table, keeping the rest behind a server-side cursor."""
+        card, next_page = self._render_page(title, columns, rows, 0, 0, None)
+        if next_page is not None:
+            cursor_id = self.cursor_store.create(conversation_id, title, columns, rows)
+            self._add_next_page_action(card, cursor_id, next_page)
+        return card
+
+    def render_result_page(self, conversation_id: str, cursor_id: str, offset: int,
+                           column_offset: int = 0, column_count: int = None):
+        """Renders the page starting at row `offset` and column `column_offset` for a cursor, or None
+        if the cursor is gone or the page is out of range."""
+        cursor = self.cursor_store.get(cursor_id, conversation_id)
+        if cursor is None:
+            return None
+        columns, rows = cursor["columns"], cursor["rows"]
+        if not 0 <= offset < max(len(rows), 1) or not 0 <= column_offset < max(len(columns), 1):
+            return None
+        if column_count is not None and column_count < 1:
+            return None
+        card, next_page = self._render_page(cursor["title"], columns, rows, offset, column_offset, column_count)
+        if next_page is not None:
+            self._add_next_page_action(card, cursor_id, next_page)
+        return card
+
+    @classmethod
+    def get_page_request(cls, value):
+        """Returns (cursor_id, offset, column_offset, column_count) if an activity value is a "next page"
+        submit, otherwise None. The result can be passed straight to `render_result_page`."""
+        if not isinstance(value, dict) or value.get("action") != cls.PAGE_ACTION:
+            return None
+        try:
+            column_count = value.get("column_count")
+            return (str(value["cursor_id"]),
+                    int(value["offset"]),
+                    int(value.get("column_offset", 0)),
+                    None if column_count is None else int(column_count))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def parse_table(result):
+        """Extracts (columns, rows) from a tabular result, or returns None if it is not tabular.
+
+        Understands markdown tables (the format Genie returns), JSON lists of objects and
+        JSON objects with "columns" and "data" keys. Rows with missing cells are padded with
+        blanks and extra cells are cut off, so every row has one cell per column.
+        """
+        if not isinstance(result, str):
+            return None
+        text = result.strip()
+        if text.startswith("|"):
+            return CardRenderer._parse_markdown_table(text)
+        if text.startswith("[") or text.startswith("{"):
+            try:
+                return CardRenderer._parse_json_table(json.loads(text))
+            except ValueError:
+                return None
+        return None
+
+    @staticmethod
+    def _parse_markdown_table(text):
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        if len(lines) < 2 or not all(line.startswith("|") for line in lines):
+            return None
+
+        def split_row(line):
+            return [cell.strip() for cell in line.strip("|").split("|")]
+
+        separator = split_row(lines[1])
+        if not all(cell and set(cell) <= set("-: ") for cell in separator):
+            return None
+        columns = split_row(lines[0])
+        rows = [CardRenderer._fit_row(split_row(line), len(columns)) for line in lines[2:]]
+        return columns, rows
+
+    @staticmethod
+    def _parse_json_table(data):
+        if isinstance(data, dict) and isinstance(data.get("columns"), list) and isinstance(data.get("data"), list):
+            columns = [str(column) for column in data["columns"]]
+            rows = [CardRenderer._fit_row([str(value) for value in (row if isinstance(row, list) else [row])],
+                                          len(columns))
+                    for row in data["data"]]
+            return columns, rows
+        if isinstance(data, list) and data and all(isinstance(item, dict) for item in data):
+            columns = []
+            for item in data:
+                columns.extend(key for key in item if key not in columns)
+            rows = [[str(item.get(column, "")) for column in columns] for item in data]
+            return columns, rows
+        return None
+
+    @staticmethod
+    def _fit_row(row: list, width: int) -> list:
+        return (row + [""] * width)[:width]
+
+    def _render_page(self, title, columns, rows, offset, column_offset, column_count):
+        # Returns the card for rows[offset:] and columns[column_offset:], and the (offset, column_offset,
+        # column_count) of the next page, or None on the last page. Tables too wide for one card are
+        # split into bands of columns; pages go down the rows of a band, then on to the next band.
+        # column_count caps the band width, so a band never widens as it goes down.
+        # Leave room for the "Next page" action, which is added once the page is known.
+        max_bytes = self.max_card_bytes - self._next_page_action_bytes()
+        count = min(self.rows_per_page, len(rows) - offset)
+        width = len(columns) - column_offset
+        if column_count is not None:
+            width = min(width, column_count)
+        cell_chars = self.max_cell_chars
+        card = self._build_table_card(title, columns, rows, offset, count, column_offset, width, cell_chars)
+        size = self._card_size(card)
+
+        while size > max_bytes and count > 1:
+            count = max(1, min(count - 1, count * max_bytes // size))
+            card = self._build_table_card(title, columns, rows, offset, count, column_offset, width, cell_chars)
+            size = self._card_size(card)
+
+        # A single row can still be too wide; shorten its cells, then show fewer columns.
+        while size > max_bytes and cell_chars > MIN_CELL_CHARS:
+            cell_chars = max(cell_chars // 2, MIN_CELL_CHARS)
+            card = self._build_table_card(title, columns, rows, offset, count, column_offset, width, cell_chars)
+            size = self._card_size(card)
+
+        while size > max_bytes and width > 1:
+            width = max(1, min(width - 1, width * max_bytes // size))
+            card = self._build_table_card(title, columns, rows, offset, count, column_offset, width, cell_chars)
+            size = self._card_size(card)
+
+        if size > max_bytes:
+            logging.warning(f"Table card for '{self._truncate(title, 100)}' is {size} bytes even with one column; "
+                            f"sending a notice instead.")
+            return self._build_too_large_card(title, columns, rows), None
+
+        if offset + count < len(rows):
+            return card, (offset + count, column_offset, width)
+        if column_offset + width < len(columns):
+            return card, (0, column_offset + width, None)
+        return card, None
+
+    def _build_table_card(self, title, columns, rows, offset, count, column_offset, width, cell_chars):
+        card = instantiate(TABLE_PAGE_CARD)
+        header, table, footer = card["body"]
+        header["text"] = self._truncate(title, self.max_cell_chars)
+        band = slice(column_offset, column_offset + width)
+        table["columns"] = [{"width": 1} for _ in columns[band]]
+        table["rows"] = [self._table_row(columns[band], cell_chars)]
+        table["rows"].extend(self._table_row(row[band], cell_chars) for row in rows[offset:offset + count])
+        if count > 0:
+            footer["text"] = f"Rows {offset + 1}-{offset + count} of {len(rows)}"
+        else:
+            footer["text"] = "No rows returned."
+        if width < len(columns):
+            footer["text"] += f", columns {column_offset + 1}-{column_offset + width} of {len(columns)}"
+        return card
+
+    def _build_too_large_card(self, title, columns, rows):
+        card = instantiate(TABLE_PAGE_CARD)
+        header, _, footer = card["body"]
+        header["text"] = self._truncate(title, 100)
+        footer["text"] = f"This result ({len(rows)} rows, {len(columns)} columns) is too wide to display."
+        card["body"] = [header, footer]
+        return card
+
+    def _table_row(self, values, cell_chars):
+        return {
+            "type": "TableRow",
+            "cells": [{"type": "TableCell",
+                       "items": [{"type": "TextBlock", "text": self._truncate(str(value), cell_chars), "wrap": True}]}
+                      for value in values]
+        }
+
+    def _next_page_action_bytes(self) -> int:
+        # The most a "Next page" action can add to a card: a uuid4 hex cursor id and large offsets.
+        card = {"actions": []}
+        empty = self._card_size(card)
+        self._add_next_page_action(card, "0" * 32, (10 ** 9, 10 ** 9, 10 ** 9))
+        return self._card_size(card) - empty
+
+    def _add_next_page_action(self, card, cursor_id, next_page):
+        offset, column_offset, column_count = next_page
+        action = instantiate(NEXT_PAGE_ACTION)
+        action["data"] = {"action": self.PAGE_ACTION,
+                          "cursor_id": cursor_id,
+                          "offset": offset,
+                          "column_offset": column_offset,
+                          "column_count": column_count}
+        card["actions"].append(action)
+
+    def _shrink_to_bytes(self, value: str, max_bytes: int) -> str:
+        # Truncates a string so it takes at most max_bytes once JSON-encoded into the card.
+        if self._card_size(value) <= max_bytes:
+            return value
+        while value and self._card_size(value + "…") > max_bytes:
+            # Shrink in proportion to the overshoot, accounting for JSON escaping.
+            value = value[:max(len(value) * max_bytes // self._card_size(value + "…") - 1, 0)]
+        return value + "…"
+
+    @staticmethod
+    def _truncate(text: str, max_chars: int) -> str:
+        if len(text) <= max_chars:
+            return text
+        if max_chars <= 0:
+            return ""
+        return text[:max_chars - 1] + "…"
+
+    @staticmethod
+    def _card_size(card) -> int:
+        return len(json.dumps(card, ensure_ascii=False).encode("utf-8"))
@@ -0,0 +1,52 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import time
+import uuid
+from collections import OrderedDict
+
+
+class ResultCursorStore:
+    """Keeps tabular results server-side so later pages can be served without re-running the query.
+
+    Cursors are scoped to the conversation that created them, expire after `ttl_seconds`
+    and the least recently used cursor is evicted once `max_cursors` is reached.
+    """
+
+    def __init__(self, ttl_seconds: float = 3600, max_cursors: int = 500):
+        self.ttl_seconds = ttl_seconds
+        self.max_cursors = max_cursors
+        self._cursors = OrderedDict()
+
+    def create(self, conversation_id: str, title: str, columns: list, rows: list) -> str:
+        self._evict_expired()
+        cursor_id = uuid.uuid4().hex
+        self._cursors[cursor_id] = {
+            "conversation_id": conversation_id,
+            "title": title,
+            "columns": columns,
+            "rows": rows,
+            "created_at": time.monotonic(),
+        }
+        while len(self._cursors) > self.max_cursors:
+            self._cursors.popitem(last=False)
+        return cursor_id
+
+    def get(self, cursor_id: str, conversation_id: str):
+        # Returns the cursor, or None if it is unknown, expired or owned by another conversation.
+        self._evict_expired()
+        cursor = self._cursors.get(cursor_id)
+        if cursor is None or cursor["conversation_id"] != conversation_id:
+            return None
+        self._cursors.move_to_end(cursor_id)
+        return cursor
+
+    def __len__(self):
+        return len(self._cursors)
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [cursor_id for cursor_id, cursor in self._cursors.items()
+                   if now - cursor["created_at"] > self.ttl_seconds]
+        for cursor_id in expired:
+            del self._cursors[cursor_id]
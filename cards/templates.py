@@ -0,0 +1,68 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import copy
+
+# Prebuilt Adaptive Card templates. These are never handed out directly:
+# every card is built from a deep copy made by `instantiate`, so rendering
+# one card can never leak into another.
+
+TOOL_CALL_CARD = {
+    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+    "type": "AdaptiveCard",
+    "version": "1.5",
+    "body": [
+        {
+            "type": "TextBlock",
+            "text": "Agent Tool Call",
+            "weight": "Bolder",
+            "size": "Medium"
+        },
+        {
+            "type": "FactSet",
+            "facts": []
+        }
+    ]
+}
+
+TABLE_PAGE_CARD = {
+    "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
+    "type": "AdaptiveCard",
+    "version": "1.5",
+    "msteams": {"width": "Full"},
+    "body": [
+        {
+            "type": "TextBlock",
+            "text": "",
+            "weight": "Bolder",
+            "size": "Medium",
+            "wrap": True
+        },
+        {
+            "type": "Table",
+            "firstRowAsHeader": True,
+            "showGridLines": True,
+            "columns": [],
+            "rows": []
+        },
+        {
+            "type": "TextBlock",
+            "text": "",
+            "isSubtle": True,
+            "size": "Small",
+            "wrap": True
+        }
+    ],
+    "actions": []
+}
+
+NEXT_PAGE_ACTION = {
+    "type": "Action.Submit",
+    "title": "Next page",
+    "data": {}
+}
+
+
+def instantiate(template: dict) -> dict:
+    """Returns an independent copy of a template that is safe to mutate."""
+    return copy.deepcopy(template)
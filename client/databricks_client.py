@@ -1,16 +1,39 @@
 # Copyright © Databricks, Inc. All rights reserved.
 # Licensed under the MIT License.
 
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
 import logging
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 import httpx
 from databricks.sdk import WorkspaceClient
 from databricks_ai_bridge.genie import Genie
 
+from .scheduler import FairScheduler
+
 class DatabricksClient:
-    def __init__(self, databricks_host: str, request_timeout: float = 300):
+    def __init__(self,
+                 databricks_host: str,
+                 request_timeout: float = 300,
+                 scheduler: FairScheduler = None,
+                 recorder=None):
+        # recorder is an optional diagnostics.TrafficRecorder that captures calls for replay.
         self.databricks_host = databricks_host
+        self.scheduler = scheduler
+        self.recorder = recorder
+        # Callables taking (serving_endpoint_name, seconds) for each successful endpoint call. The time
+        # excludes any wait in the scheduler's queue.
+        self.endpoint_call_listeners = []
+        # Blocking SDK calls get their own pool, sized to the scheduler's concurrency, so every call the
+        # scheduler lets through runs at once instead of queueing in the loop's small default executor.
+        self._executor = ThreadPoolExecutor(max_workers=scheduler.max_concurrency if scheduler else 8,
+                                            thread_name_prefix="databricks-client")
         self.client = httpx.AsyncClient(
             timeout=httpx.Timeout(request_timeout),
         )
@@ -30,6 +53,15 @@ class DatabricksClient:
 
         return response.json()['access_token']
 
+    def _slot(self, tenant_id: str, user_id: str, priority: int):
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot(tenant_id, user_id, priority)
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args))
+
     def _throw_unexpected_endpoint_format(self):
         raise Exception("This app can only run against ChatModel, ChatAgent, or ResponsesAgent endpoints")
 
@@ -162,13 +194,48 @@ class DatabricksClient:
                                   serving_endpoint_name: str,
                                   text:str,
                                   provider_oauth_token: str,
-                                  history:list):
+                                  history:list,
+                                  tenant_id: str = None,
+                                  user_id: str = None,
+                                  priority: int = FairScheduler.PERSONAL,
+                                  bot_conversation_id: str = None):
+        # bot_conversation_id is the Teams conversation the call serves; it is only recorded, so
+        # replay can answer each conversation from its own captured responses.
+        request = {"serving_endpoint_name": serving_endpoint_name,
+                   "text": text,
+                   "history_length": len(history),
+                   "bot_conversation_id": bot_conversation_id}
+        if self.recorder is not None:
+            request["messages_sha256"] = self._request_hash(history + [{"role": "user", "content": text}])
+        enqueued = time.monotonic()
+        async with self._slot(tenant_id, user_id, priority):
+            started = time.monotonic()
+            try:
+                result_messages = await self._call_model_endpoint(serving_endpoint_name,
+                                                                  text,
+                                                                  provider_oauth_token,
+                                                                  history)
+            except Exception as e:
+                self._record_call("call_model_endpoint", request, enqueued, started, error=str(e))
+                raise
+            duration = self._record_call("call_model_endpoint", request, enqueued, started,
+                                         response=result_messages)
+            for listener in self.endpoint_call_listeners:
+                listener(serving_endpoint_name, duration)
+            return result_messages
+
+    async def _call_model_endpoint(self,
+                                   serving_endpoint_name: str,
+                                   text: str,
+                                   provider_oauth_token: str,
+                                   history: list):
 
         oauth_db_token = await self.exchange_token(provider_oauth_token)
 
         workspace_client = WorkspaceClient(host=self.databricks_host, token=oauth_db_token)
 
-        task_type = self._get_endpoint_task_type(workspace_client, serving_endpoint_name)
+        # The SDK calls are blocking; run them off the event loop so other turns keep flowing.
+        task_type = await self._run_blocking(self._get_endpoint_task_type, workspace_client, serving_endpoint_name)
 
         logging.info(f"Serving endpoint task type: {task_type}")
 
@@ -177,16 +244,73 @@ class DatabricksClient:
         messages = history + [{"role": "user", "content": text}]
 
         if task_type == "agent/v1/responses":
-            result_messages = self._query_responses_endpoint(workspace_client, messages, serving_endpoint_name)
+            result_messages = await self._run_blocking(self._query_responses_endpoint,
+                                                       workspace_client, messages, serving_endpoint_name)
         else:
-            result_messages = self._query_chat_endpoint(workspace_client, messages, serving_endpoint_name)
+            result_messages = await self._run_blocking(self._query_chat_endpoint,
+                                                       workspace_client, messages, serving_endpoint_name)
 
         return result_messages
 
+    async def get_serving_endpoint(self, serving_endpoint_name: str, oauth_db_token: str) -> dict:
+        """Fetches a serving endpoint's definition and state without blocking the event loop."""
+        url = f"{self.databricks_host}/api/2.0/serving-endpoints/{serving_endpoint_name}"
+
+        response = await self.client.get(url, headers={"Authorization": f"Bearer {oauth_db_token}"})
+        response.raise_for_status()
+
+        return response.json()
+
+    async def ping_serving_endpoint(self, serving_endpoint_name: str, oauth_db_token: str, task_type: str) -> int:
+        """Sends the smallest valid request for the endpoint's task type, waking it if it scaled to zero.
+
+        The ping is a real request made with the user's token, so it shows up in the endpoint's
+        usage logs, inference tables and traces under that user.
+        """
+        url = f"{self.databricks_host}/serving-endpoints/{serving_endpoint_name}/invocations"
+
+        if task_type == "agent/v1/responses":
+            payload = {"input": [{"role": "user", "content": "ping"}], "max_output_tokens": 1}
+        elif task_type == "llm/v1/chat":
+            payload = {"messages": [{"role": "user", "content": "ping"}], "max_tokens": 1}
+        else:
+            # Other agent schemas may reject unknown fields such as max_tokens.
+            payload = {"messages": [{"role": "user", "content": "ping"}]}
+
+        response = await self.client.post(url, json=payload, headers={"Authorization": f"Bearer {oauth_db_token}"})
+
+        return response.status_code
+
     async def call_genie_space(self, question: str,
                                provider_oauth_token:str,
                                conversation_id: str,
-                               genie_space_id: str):
+                               genie_space_id: str,
+                               tenant_id: str = None,
+                               user_id: str = None,
+                               priority: int = FairScheduler.PERSONAL,
+                               bot_conversation_id: str = None):
+        # conversation_id is the Genie conversation; bot_conversation_id is the Teams one, as above.
+        request = {"genie_space_id": genie_space_id,
+                   "question": question,
+                   "conversation_id": conversation_id,
+                   "bot_conversation_id": bot_conversation_id}
+        if self.recorder is not None:
+            request["messages_sha256"] = self._request_hash({"question": question, "conversation_id": conversation_id})
+        enqueued = time.monotonic()
+        async with self._slot(tenant_id, user_id, priority):
+            started = time.monotonic()
+            try:
+                result = await self._call_genie_space(question, provider_oauth_token, conversation_id, genie_space_id)
+            except Exception as e:
+                self._record_call("call_genie_space", request, enqueued, started, error=str(e))
+                raise
+            self._record_call("call_genie_space", request, enqueued, started, response=result)
+            return result
+
+    async def _call_genie_space(self, question: str,
+                                provider_oauth_token: str,
+                                conversation_id: str,
+                                genie_space_id: str):
 
         oauth_db_token = await self.exchange_token(provider_oauth_token)
 
@@ -194,6 +318,25 @@ class DatabricksClient:
 
         genie = Genie(genie_space_id, workspace_client)
 
-        genie_result = genie.ask_question(question, conversation_id)
+        genie_result = await self._run_blocking(genie.ask_question, question, conversation_id)
 
         return genie_result.result
+
+    @staticmethod
+    def _request_hash(payload) -> str:
+        # Fingerprints what a call sends, so replay can tell when a build sends something different.
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _record_call(self, operation: str, request: dict, enqueued: float, started: float,
+                     response=None, error: str = None) -> float:
+        # Records a finished call if capturing, and returns how long it ran after leaving the queue.
+        duration = time.monotonic() - started
+        if self.recorder is not None:
+            self.recorder.record("databricks",
+                                 operation=operation,
+                                 request=request,
+                                 response=response,
+                                 error=error,
+                                 queued_seconds=started - enqueued,
+                                 duration_seconds=duration)
+        return duration
@@ -0,0 +1,121 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from .databricks_client import DatabricksClient
+
+
+class EndpointWarmer:
+    """Wakes scale-to-zero serving endpoints in the background when a user is about to chat.
+
+    Warm-ups are rate-limited per endpoint: at most one is started every `min_interval_seconds`.
+    Calls made within `warm_window_seconds` of a successful warm-up are counted as warmed, so
+    the metrics show how call latency differs with and without a preceding warm-up. A warm-up
+    is successful only if the ping returns a 2xx status; other statuses count as `ping_failed`.
+    """
+
+    def __init__(self,
+                 databricks_client: DatabricksClient,
+                 min_interval_seconds: float = 300,
+                 warm_window_seconds: float = 900):
+        self.databricks_client = databricks_client
+        self.min_interval_seconds = min_interval_seconds
+        self.warm_window_seconds = warm_window_seconds
+        self.counters = Counter()
+        self._last_started = {}
+        self._last_warmed = {}
+        self._endpoints = {}
+        self._call_latency = {"warmed": [0, 0.0], "unwarmed": [0, 0.0]}
+        self._tasks = set()
+
+    def schedule(self, serving_endpoint_name: str, token_provider) -> bool:
+        """Starts a warm-up without waiting for it. Returns False if it was rate-limited.
+
+        `token_provider` is an async callable returning the user's provider OAuth token, or None.
+        """
+        if not serving_endpoint_name:
+            return False
+        now = time.monotonic()
+        last_started = self._last_started.get(serving_endpoint_name)
+        if last_started is not None and now - last_started < self.min_interval_seconds:
+            self.counters["skipped_rate_limited"] += 1
+            return False
+
+        self._last_started[serving_endpoint_name] = now
+        self.counters["scheduled"] += 1
+        task = asyncio.create_task(self._warm_up(serving_endpoint_name, token_provider))
+        # Keep a reference so the task is not garbage collected before it finishes.
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    def record_call(self, serving_endpoint_name: str, duration: float):
+        """Records how long a real endpoint call ran (excluding queueing), split by whether it followed a warm-up."""
+        last_warmed = self._last_warmed.get(serving_endpoint_name)
+        warmed = last_warmed is not None and time.monotonic() - last_warmed <= self.warm_window_seconds
+        latency = self._call_latency["warmed" if warmed else "unwarmed"]
+        latency[0] += 1
+        latency[1] += duration
+
+    def metrics(self) -> dict:
+        return {
+            "counters": dict(self.counters),
+            "endpoints": self._endpoints,
+            "call_latency": {
+                name: {"count": count, "mean_seconds": total / count if count else 0.0}
+                for name, (count, total) in self._call_latency.items()
+            },
+        }
+
+    async def _warm_up(self, serving_endpoint_name: str, token_provider):
+        try:
+            provider_oauth_token = await token_provider()
+            if not provider_oauth_token:
+                # Nobody to warm up on behalf of yet; let the next signal try again.
+                self.counters["skipped_no_token"] += 1
+                self._last_started.pop(serving_endpoint_name, None)
+                return
+
+            oauth_db_token = await self.databricks_client.exchange_token(provider_oauth_token)
+            endpoint = await self.databricks_client.get_serving_endpoint(serving_endpoint_name, oauth_db_token)
+            state = endpoint.get("state", {})
+            served_entities = (endpoint.get("config", {}).get("served_entities")
+                               or endpoint.get("config", {}).get("served_models")
+                               or [])
+            scale_to_zero = any(entity.get("scale_to_zero_enabled") for entity in served_entities)
+
+            endpoint_metrics = self._endpoints.setdefault(serving_endpoint_name, {})
+            endpoint_metrics["ready"] = state.get("ready")
+            endpoint_metrics["scale_to_zero_enabled"] = scale_to_zero
+            self.counters["checks"] += 1
+
+            if not scale_to_zero:
+                # Nothing was pinged, so calls to this endpoint must not count as warmed.
+                self.counters["skipped_always_on"] += 1
+                return
+
+            started = time.monotonic()
+            status = await self.databricks_client.ping_serving_endpoint(serving_endpoint_name,
+                                                                        oauth_db_token,
+                                                                        endpoint.get("task", ""))
+            ping_seconds = time.monotonic() - started
+
+            endpoint_metrics["last_ping_status"] = status
+            endpoint_metrics["last_ping_seconds"] = ping_seconds
+            if not 200 <= status < 300:
+                # A rejected or failed ping may not have woken anything, so later calls stay unwarmed.
+                self.counters["ping_failed"] += 1
+                logging.warning(f"Warm-up ping to serving endpoint {serving_endpoint_name} returned status {status}")
+                return
+
+            self.counters["pings"] += 1
+            self._last_warmed[serving_endpoint_name] = time.monotonic()
+            logging.info(f"Warmed up serving endpoint {serving_endpoint_name} in {ping_seconds:.2f}s (status {status})")
+
+        except Exception as e:
+            self.counters["failures"] += 1
+            logging.warning(f"Warm-up of serving endpoint {serving_endpoint_name} failed: {e}")
@@ -0,0 +1,233 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+
+class FairScheduler:
+    """Limits concurrent outbound calls and shares them fairly across classes, tenants and users.
+
+    Calls beyond `max_concurrency` wait in a queue. Each free slot goes through three levels:
+    the priority class that is furthest behind its weighted share (`class_weights`, personal 4 :
+    channel 1 by default, so busy personal chats slow channel mentions down but never starve
+    them), then the tenant in that class furthest behind its share, then the user in that tenant
+    with the earliest start-time fair queuing tag. Costs are charged in seconds of actual call
+    duration, so long multi-tool agent runs count for more, and a heavy user or tenant only
+    delays itself.
+    """
+
+    PERSONAL = 0
+    CHANNEL = 1
+    CLASS_NAMES = {PERSONAL: "personal", CHANNEL: "channel"}
+
+    def __init__(self,
+                 max_concurrency: int = 8,
+                 tenant_weights: dict = None,
+                 user_weights: dict = None,
+                 class_weights: dict = None):
+        # class_weights maps "personal" / "channel" to their share of slots under contention.
+        if max_concurrency < 1:
+            raise Exception("[FairScheduler]: max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.tenant_weights = tenant_weights or {}
+        self.user_weights = user_weights or {}
+        self.class_weights = {"personal": 4.0, "channel": 1.0, **(class_weights or {})}
+        self._active = 0
+        self._sequence = itertools.count()
+        # priority -> tenant id -> heap of (user tag, sequence, waiter, estimated cost)
+        self._queues = {self.PERSONAL: {}, self.CHANNEL: {}}
+        # Service received, in cost divided by weight, per class and per (class, tenant). Finished
+        # calls are settled at their real duration; running calls are pending at their estimate.
+        self._class_service = {self.PERSONAL: 0.0, self.CHANNEL: 0.0}
+        self._class_pending = {self.PERSONAL: 0.0, self.CHANNEL: 0.0}
+        self._tenant_service = {}
+        self._tenant_pending = {}
+        # Start-time fair queuing state for the users of each (class, tenant).
+        self._tenant_virtual_time = {}
+        self._user_finish = {}
+        # Expected cost of a call in seconds, tracked as a moving average of real call durations.
+        self._estimated_cost = 1.0
+        self._stats = {priority: {"dispatched": 0, "waited": 0, "total_wait": 0.0, "max_wait": 0.0}
+                       for priority in self._queues}
+
+    @staticmethod
+    def parse_weights(text: str) -> dict:
+        """Parses "key=weight,key=weight" into a dict, as used by the SCHEDULER_*_WEIGHTS settings."""
+        weights = {}
+        for entry in (text or "").split(","):
+            key, _, weight = entry.strip().partition("=")
+            if key and weight:
+                weights[key.strip()] = float(weight)
+        return weights
+
+    @asynccontextmanager
+    async def slot(self, tenant_id: str, user_id: str, priority: int = PERSONAL):
+        """Waits for a fair turn, holding one unit of concurrency for the body of the block."""
+        tenant_key = (priority, tenant_id or "")
+        user_key = (priority, tenant_id or "", user_id or "")
+        cost = await self._acquire(tenant_key, user_key)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(tenant_key, user_key, cost, time.monotonic() - started)
+
+    def metrics(self) -> dict:
+        return {
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "estimated_cost_seconds": self._estimated_cost,
+            "classes": {
+                self.CLASS_NAMES[priority]: {
+                    "queued": self._queued(priority),
+                    "dispatched": stats["dispatched"],
+                    "waited": stats["waited"],
+                    "mean_wait_seconds": stats["total_wait"] / stats["waited"] if stats["waited"] else 0.0,
+                    "max_wait_seconds": stats["max_wait"],
+                }
+                for priority, stats in self._stats.items()
+            },
+        }
+
+    async def _acquire(self, tenant_key, user_key) -> float:
+        # Returns the estimated cost the call was charged, which _release settles.
+        priority, tenant_id = tenant_key
+        cost = self._estimated_cost
+        start = max(self._tenant_virtual_time.get(tenant_key, 0.0), self._user_finish.get(user_key, 0.0))
+        self._user_finish[user_key] = start + cost / self._user_weight(user_key)
+
+        stats = self._stats[priority]
+        if self._active < self.max_concurrency and not any(self._queued(other) for other in self._queues):
+            self._active += 1
+            self._tenant_virtual_time[tenant_key] = start
+            self._charge_pending(tenant_key, cost)
+            stats["dispatched"] += 1
+            return cost
+
+        # A class or tenant that was idle must not bank credit and then monopolise the slots,
+        # so its settled service starts level with the least-served one that is already waiting.
+        if not self._queued(priority):
+            self._level(self._class_service, priority,
+                        [other for other in self._queues if other != priority and self._queued(other)])
+        tenant_queues = self._queues[priority]
+        if not self._tenant_queued(tenant_queues.get(tenant_id)):
+            self._level(self._tenant_service, tenant_key,
+                        [(priority, other) for other, queue in tenant_queues.items()
+                         if other != tenant_id and self._tenant_queued(queue)])
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(tenant_queues.setdefault(tenant_id, []), (start, next(self._sequence), waiter, cost))
+        enqueued = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The call never ran, so take back the finish tag it advanced; otherwise a user whose
+            # turns time out would be pushed behind everyone else for calls it never made.
+            self._user_finish[user_key] = self._user_finish.get(user_key, 0.0) - cost / self._user_weight(user_key)
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on.
+                self._charge_pending(tenant_key, -cost)
+                self._active -= 1
+                self._dispatch()
+            raise
+
+        wait = time.monotonic() - enqueued
+        stats["waited"] += 1
+        stats["total_wait"] += wait
+        stats["max_wait"] = max(stats["max_wait"], wait)
+        return cost
+
+    def _release(self, tenant_key, user_key, cost: float, duration: float):
+        # Swap the estimated cost charged at dispatch for the real duration of the call.
+        priority = tenant_key[0]
+        self._charge_pending(tenant_key, -cost)
+        self._class_service[priority] += duration / self._class_weight(priority)
+        self._tenant_service[tenant_key] = (self._tenant_service.get(tenant_key, 0.0)
+                                            + duration / self._tenant_weight(tenant_key))
+        self._user_finish[user_key] = (self._user_finish.get(user_key, 0.0)
+                                       + (duration - cost) / self._user_weight(user_key))
+        self._estimated_cost = 0.9 * self._estimated_cost + 0.1 * duration
+
+        self._active -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while self._active < self.max_concurrency:
+            self._drop_cancelled()
+            waiting = [priority for priority, tenant_queues in self._queues.items() if tenant_queues]
+            if not waiting:
+                self._reset_if_idle()
+                return
+
+            # Serve the class, then the tenant, that is furthest behind its weighted share.
+            # Ties go to personal chats.
+            priority = min(waiting, key=lambda candidate: (
+                self._class_service[candidate] + self._class_pending[candidate], candidate))
+            tenant_queues = self._queues[priority]
+            tenant_id = min(tenant_queues, key=lambda candidate: (
+                self._tenant_service.get((priority, candidate), 0.0)
+                + self._tenant_pending.get((priority, candidate), 0.0)))
+            tenant_key = (priority, tenant_id)
+
+            tag, _, waiter, cost = heapq.heappop(tenant_queues[tenant_id])
+            if not tenant_queues[tenant_id]:
+                del tenant_queues[tenant_id]
+            self._tenant_virtual_time[tenant_key] = max(self._tenant_virtual_time.get(tenant_key, 0.0), tag)
+            self._charge_pending(tenant_key, cost)
+            self._stats[priority]["dispatched"] += 1
+            self._active += 1
+            waiter.set_result(None)
+
+    def _charge_pending(self, tenant_key, cost: float):
+        priority = tenant_key[0]
+        self._class_pending[priority] += cost / self._class_weight(priority)
+        pending = self._tenant_pending.get(tenant_key, 0.0) + cost / self._tenant_weight(tenant_key)
+        if abs(pending) < 1e-9:
+            self._tenant_pending.pop(tenant_key, None)
+        else:
+            self._tenant_pending[tenant_key] = pending
+
+    def _drop_cancelled(self):
+        for tenant_queues in self._queues.values():
+            for tenant_id in list(tenant_queues):
+                queue = tenant_queues[tenant_id]
+                while queue and queue[0][2].done():
+                    heapq.heappop(queue)
+                if not queue:
+                    del tenant_queues[tenant_id]
+
+    def _reset_if_idle(self):
+        # With nothing queued, past service and finish times no longer matter; drop them so the maps stay small.
+        if self._active == 0 and not any(self._queues.values()):
+            self._tenant_service.clear()
+            self._tenant_pending.clear()
+            self._tenant_virtual_time.clear()
+            self._user_finish.clear()
+            for priority in self._class_service:
+                self._class_service[priority] = 0.0
+                self._class_pending[priority] = 0.0
+
+    @staticmethod
+    def _level(service: dict, key, backlogged_keys: list):
+        if backlogged_keys:
+            service[key] = max(service.get(key, 0.0), min(service.get(other, 0.0) for other in backlogged_keys))
+
+    @staticmethod
+    def _tenant_queued(queue) -> bool:
+        return bool(queue) and any(not entry[2].done() for entry in queue)
+
+    def _queued(self, priority: int) -> int:
+        return sum(1 for queue in self._queues[priority].values() for entry in queue if not entry[2].done())
+
+    def _class_weight(self, priority: int) -> float:
+        return max(self.class_weights.get(self.CLASS_NAMES[priority], 1.0), 0.001)
+
+    def _tenant_weight(self, tenant_key) -> float:
+        return max(self.tenant_weights.get(tenant_key[1], 1.0), 0.001)
+
+    def _user_weight(self, user_key) -> float:
+        return max(self.user_weights.get(user_key[2], 1.0), 0.001)
@@ -19,3 +19,15 @@ class DefaultConfig:
     DATABRICKS_HOST = os.environ.get("DATABRICKS_HOST", "")
     SERVING_ENDPOINT_NAME = os.environ.get("SERVING_ENDPOINT_NAME", "")
     GENIE_SPACE_ID = os.environ.get("GENIE_SPACE_ID", "")
+    # Outbound agent/Genie call scheduling. Weights are "id=weight,id=weight"; unlisted ids weigh 1.
+    SCHEDULER_MAX_CONCURRENCY = int(os.environ.get("SCHEDULER_MAX_CONCURRENCY", "8"))
+    SCHEDULER_TENANT_WEIGHTS = os.environ.get("SCHEDULER_TENANT_WEIGHTS", "")
+    SCHEDULER_USER_WEIGHTS = os.environ.get("SCHEDULER_USER_WEIGHTS", "")
+    # Share of slots for "personal" chats vs "channel" mentions when both are waiting.
+    SCHEDULER_CLASS_WEIGHTS = os.environ.get("SCHEDULER_CLASS_WEIGHTS", "personal=4,channel=1")
+    # Traffic capture for replay. Capturing is off when the path is empty.
+    TRAFFIC_CAPTURE_PATH = os.environ.get("TRAFFIC_CAPTURE_PATH", "")
+    TRAFFIC_CAPTURE_MAX_BYTES = int(os.environ.get("TRAFFIC_CAPTURE_MAX_BYTES", str(50 * 1024 * 1024)))
+    TRAFFIC_CAPTURE_BACKUPS = int(os.environ.get("TRAFFIC_CAPTURE_BACKUPS", "5"))
+    # Bearer token for the /admin diagnostics routes. The routes are not registered when empty.
+    ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
@@ -0,0 +1,18 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+from .loop_monitor import LoopMonitor
+from .memory import MemoryTracker, largest_conversation_states
+from .profiler import SamplingProfiler
+from .recorder import TrafficRecorder, TrafficRecorderMiddleware
+from .routes import AdminRoutes
+
+__all__ = [
+    "AdminRoutes",
+    "LoopMonitor",
+    "MemoryTracker",
+    "SamplingProfiler",
+    "TrafficRecorder",
+    "TrafficRecorderMiddleware",
+    "largest_conversation_states",
+]
@@ -0,0 +1,75 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import logging
+import time
+
+
+class _SlowCallbackHandler(logging.Handler):
+    # Collects the "Executing <callback> took N seconds" warnings asyncio logs in debug mode.
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing"):
+            self.records.append(record.getMessage())
+
+
+class LoopMonitor:
+    """Measures event-loop lag and reports slow callbacks over a bounded window.
+
+    asyncio debug mode is only switched on while a measurement is running, so
+    there is no cost when the monitor is idle.
+    """
+
+    def __init__(self):
+        self._lock = asyncio.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    async def measure(self, seconds: float, interval: float = 0.05, slow_callback_duration: float = 0.1) -> dict:
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            previous_debug = loop.get_debug()
+            previous_slow_duration = loop.slow_callback_duration
+            asyncio_logger = logging.getLogger("asyncio")
+            handler = _SlowCallbackHandler()
+
+            asyncio_logger.addHandler(handler)
+            loop.slow_callback_duration = slow_callback_duration
+            loop.set_debug(True)
+            lags = []
+            try:
+                deadline = time.monotonic() + seconds
+                while time.monotonic() < deadline:
+                    started = time.monotonic()
+                    await asyncio.sleep(interval)
+                    lags.append(max(time.monotonic() - started - interval, 0.0))
+            finally:
+                loop.set_debug(previous_debug)
+                loop.slow_callback_duration = previous_slow_duration
+                asyncio_logger.removeHandler(handler)
+
+            lags.sort()
+            return {
+                "samples": len(lags),
+                "interval_ms": interval * 1000,
+                "lag_ms": {
+                    "mean": sum(lags) / len(lags) * 1000 if lags else 0.0,
+                    "p50": self._percentile(lags, 0.5) * 1000,
+                    "p99": self._percentile(lags, 0.99) * 1000,
+                    "max": lags[-1] * 1000 if lags else 0.0,
+                },
+                "slow_callback_threshold_ms": slow_callback_duration * 1000,
+                "slow_callbacks": handler.records,
+            }
+
+    @staticmethod
+    def _percentile(sorted_values: list, fraction: float) -> float:
+        if not sorted_values:
+            return 0.0
+        return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
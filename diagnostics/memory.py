@@ -0,0 +1,105 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import json
+import tracemalloc
+
+from botbuilder.core import MemoryStorage
+
+
+class MemoryTracker:
+    """Takes tracemalloc snapshots and diffs each one against the previous snapshot.
+
+    Tracing is only enabled between `start` and `stop`, as tracemalloc slows down
+    every allocation while it is active.
+    """
+
+    def __init__(self, frames: int = 10):
+        self.frames = frames
+        self._previous_snapshot = None
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        self._previous_snapshot = self._take_snapshot()
+
+    def stop(self):
+        self._previous_snapshot = None
+        tracemalloc.stop()
+
+    def snapshot(self, top: int = 25) -> dict:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc is not running")
+        snapshot = self._take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        diff = snapshot.compare_to(self._previous_snapshot, "traceback") if self._previous_snapshot else []
+        self._previous_snapshot = snapshot
+        return {
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "top": [self._format_stat(stat) for stat in snapshot.statistics("traceback")[:top]],
+            "diff": [self._format_stat(stat) for stat in diff[:top]],
+        }
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    @staticmethod
+    def _format_stat(stat) -> dict:
+        entry = {
+            "size_bytes": stat.size,
+            "count": stat.count,
+            "traceback": stat.traceback.format(),
+        }
+        if hasattr(stat, "size_diff"):
+            entry["size_diff_bytes"] = stat.size_diff
+            entry["count_diff"] = stat.count_diff
+        return entry
+
+
+def largest_conversation_states(storage: MemoryStorage, top: int = 20, max_scanned: int = 5000,
+                                history_sample: int = 10) -> dict:
+    """Lists the largest conversation states held in a MemoryStorage, biggest first.
+
+    This runs on the event loop of a bot that may already be bloated, so it stays cheap: at most
+    `max_scanned` states are looked at, and each history size is extrapolated from a sample of
+    `history_sample` messages instead of serialising the whole conversation.
+    """
+    states = []
+    total = 0
+    # ConversationState stores each conversation under "<channel>/conversations/<conversation id>".
+    for key, value in list(storage.memory.items()):
+        if "/conversations/" not in key:
+            continue
+        total += 1
+        if total > max_scanned:
+            continue
+        history = value.get("history") if isinstance(value, dict) else None
+        history = history if isinstance(history, list) else []
+        history_bytes = _estimate_list_bytes(history, history_sample)
+        other_bytes = len(json.dumps({name: item for name, item in value.items() if name != "history"},
+                                     default=str)) if isinstance(value, dict) else 0
+        states.append({
+            "key": key,
+            "estimated_size_bytes": history_bytes + other_bytes,
+            "history_messages": len(history),
+            "estimated_history_bytes": history_bytes,
+        })
+    states.sort(key=lambda state: state["estimated_size_bytes"], reverse=True)
+    return {"conversations": total, "scanned": min(total, max_scanned), "states": states[:top]}
+
+
+def _estimate_list_bytes(items: list, sample: int) -> int:
+    # Serialises evenly spaced items and scales up to the full list.
+    if not items:
+        return 0
+    sampled = items[::max(len(items) // sample, 1)][:sample]
+    return len(json.dumps(sampled, default=str)) * len(items) // len(sampled)
@@ -0,0 +1,56 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Statistical CPU profiler that samples the stack of one thread from a background thread.
+
+    Nothing runs until `start` is called. Output is in the collapsed-stack format
+    ("frame;frame;frame count") understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self):
+        self._samples = Counter()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, target_thread_id: int, interval: float = 0.005):
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self._samples = Counter()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        args=(target_thread_id, interval),
+                                        name="sampling-profiler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.collapsed_stacks()
+
+    def collapsed_stacks(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self._samples.most_common())
+
+    def _run(self, target_thread_id: int, interval: float):
+        while not self._stop_event.wait(interval):
+            frame = sys._current_frames().get(target_thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            self._samples[";".join(reversed(stack))] += 1
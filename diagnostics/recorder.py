@@ -0,0 +1,113 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import time
+from typing import Awaitable, Callable, List
+
+from botbuilder.core import Middleware, TurnContext
+from botbuilder.schema import Activity, ResourceResponse
+
+REDACTED = "[REDACTED]"
+
+_SENSITIVE_KEY = re.compile(r"token|authorization|password|secret|assertion", re.IGNORECASE)
+_JWT = re.compile(r"eyJ[\w-]+\.[\w-]+\.[\w-]*")
+_BEARER = re.compile(r"Bearer\s+[\w.~+/=-]+", re.IGNORECASE)
+
+
+def redact(value):
+    """Returns a copy of a JSON-like value with credentials removed."""
+    if isinstance(value, dict):
+        return {key: REDACTED if isinstance(item, str) and item and _SENSITIVE_KEY.search(str(key)) else redact(item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item) for item in value]
+    if isinstance(value, str):
+        return _BEARER.sub(f"Bearer {REDACTED}", _JWT.sub(REDACTED, value))
+    return value
+
+
+class _EventQueueHandler(logging.handlers.QueueHandler):
+    # Hands the event dict to the writer thread as is; the default would format it on the caller.
+    def prepare(self, record):
+        return record
+
+
+class _JsonLineFormatter(logging.Formatter):
+    # Serialises an event on the writer thread. RotatingFileHandler formats each record twice,
+    # once to check the size and once to write it, so the line is kept on the record.
+    def format(self, record):
+        if not hasattr(record, "json_line"):
+            record.json_line = json.dumps(record.msg, separators=(",", ":"), default=str)
+        return record.json_line
+
+
+class TrafficRecorder:
+    """Appends bot traffic to a size-rotated JSONL file for later replay.
+
+    Each line is one event with a wall-clock timestamp `ts` and a `kind`:
+    "incoming" and "incoming_done" for /api/messages requests, "databricks" for
+    outbound Databricks calls and "outgoing" for activities the bot sends to Teams.
+    Everything is passed through `redact` before it is queued. Serialising, writing and
+    rotating happen on a background thread, so recording never waits on the disk.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backup_count: int = 5):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count,
+                                                            encoding="utf-8")
+        file_handler.setFormatter(_JsonLineFormatter())
+        events = queue.SimpleQueue()
+        # A logger of its own, outside the logging hierarchy, so events never reach the app's log handlers.
+        self._logger = logging.Logger("traffic_recorder")
+        self._logger.propagate = False
+        self._logger.addHandler(_EventQueueHandler(events))
+        self._listener = logging.handlers.QueueListener(events, file_handler)
+        self._listener.start()
+        self._closed = False
+        # Write out whatever is still queued when the process exits.
+        atexit.register(self.close)
+
+    def record(self, kind: str, **fields):
+        try:
+            # Redacting copies the event, so later changes to the originals cannot race the writer thread.
+            self._logger.info(redact({"ts": time.time(), "kind": kind, **fields}))
+        except Exception as e:
+            # Capturing must never break a turn.
+            logging.warning(f"Failed to record {kind} traffic: {e}")
+
+    def close(self):
+        # Waits for queued events to be written, then closes the file.
+        if self._closed:
+            return
+        self._closed = True
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+
+
+class TrafficRecorderMiddleware(Middleware):
+    """Records every activity the bot sends back to Teams."""
+
+    def __init__(self, recorder: TrafficRecorder):
+        self.recorder = recorder
+
+    async def on_turn(self, context: TurnContext, logic: Callable[[TurnContext], Awaitable]):
+        context.on_send_activities(self._record_outgoing)
+        await logic()
+
+    async def _record_outgoing(self, context: TurnContext, activities: List[Activity],
+                               next_send: Callable[[], Awaitable[List[ResourceResponse]]]):
+        for activity in activities:
+            self.recorder.record("outgoing",
+                                 reply_to=context.activity.id,
+                                 conversation_id=context.activity.conversation.id,
+                                 activity=activity.serialize())
+        return await next_send()
@@ -0,0 +1,303 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+"""Replays a traffic capture through app.py against local stand-ins and compares builds.
+
+Record traffic by setting TRAFFIC_CAPTURE_PATH, then:
+
+    python -m diagnostics.replay run capture.jsonl --speed 10 --label my-branch --out my-branch.json
+    python -m diagnostics.replay compare main.json my-branch.json
+
+During a run, Databricks calls are answered from the capture after sleeping for their recorded
+duration (divided by --speed), sign-in is stubbed and outgoing Teams activities are collected
+locally instead of being sent. Everything else, including dialogs, card rendering and the
+scheduler, runs as deployed.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+
+
+def load_capture(paths: list) -> list:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as capture_file:
+            records.extend(json.loads(line) for line in capture_file if line.strip())
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+def summarize_latencies(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"count": 0}
+
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)]
+
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": latencies[-1],
+    }
+
+
+def summarize_activity(activity: dict) -> dict:
+    # Keeps the parts of an outgoing activity that should match between builds.
+    # Card texts are compared, but not action data, which holds per-run cursor ids.
+    summary = {"type": activity.get("type"), "text": activity.get("text")}
+    attachments = activity.get("attachments") or []
+    if attachments:
+        summary["attachments"] = [{"content_type": attachment.get("contentType"),
+                                   "texts": _card_texts(attachment.get("content"))}
+                                  for attachment in attachments]
+    return summary
+
+
+def _card_texts(element) -> list:
+    texts = []
+    if isinstance(element, dict):
+        for key, value in element.items():
+            if key == "data":
+                continue
+            if key in ("text", "title", "value") and isinstance(value, str):
+                texts.append(value)
+            else:
+                texts.extend(_card_texts(value))
+    elif isinstance(element, list):
+        for item in element:
+            texts.extend(_card_texts(item))
+    return texts
+
+
+async def run_replay(records: list, speed: float, label: str) -> dict:
+    # Auth and capture must be configured before app.py reads its configuration.
+    os.environ["MicrosoftAppId"] = ""
+    os.environ["MicrosoftAppPassword"] = ""
+    os.environ["TRAFFIC_CAPTURE_PATH"] = ""
+
+    from aiohttp.test_utils import TestClient, TestServer
+    from botbuilder.core import Middleware
+    from botbuilder.schema import ResourceResponse, TokenResponse
+
+    import app
+    from client.databricks_client import DatabricksClient
+
+    # The captured record answering the call in flight on the current task.
+    current_record = contextvars.ContextVar("current_record")
+
+    class ReplayDatabricksClient(DatabricksClient):
+        # Answers calls from the capture, in recorded order per conversation and request, after the
+        # recorded duration. Conversations replay concurrently, so responses are never shared between
+        # them. A call whose messages differ from the recorded ones still gets the recorded answer,
+        # but is counted in request_mismatches.
+        def __init__(self, databricks_records: list, scheduler):
+            super().__init__("http://replay.invalid", scheduler=scheduler)
+            self.responses = defaultdict(deque)
+            self.request_mismatches = []
+            for record in databricks_records:
+                request = record.get("request") or {}
+                key = (record["operation"], request.get("bot_conversation_id"),
+                       request.get("text", request.get("question")))
+                self.responses[key].append(record)
+
+        def _take_record(self, operation: str, bot_conversation_id: str, text: str, messages_sha256: str):
+            queue = self.responses.get((operation, bot_conversation_id, text))
+            if not queue:
+                raise Exception(f"No recorded {operation} response for {text!r} in {bot_conversation_id!r}")
+            record = queue.popleft()
+            if record["request"].get("messages_sha256") != messages_sha256:
+                self.request_mismatches.append({"operation": operation,
+                                                "conversation_id": bot_conversation_id,
+                                                "text": text})
+            current_record.set(record)
+
+        async def _replay_response(self):
+            record = current_record.get()
+            await asyncio.sleep(record.get("duration_seconds", 0) / speed if speed > 0 else 0)
+            if record.get("error"):
+                raise Exception(record["error"])
+            return record["response"]
+
+        async def call_model_endpoint(self, serving_endpoint_name, text, provider_oauth_token, history,
+                                      bot_conversation_id=None, **kwargs):
+            self._take_record("call_model_endpoint", bot_conversation_id, text,
+                              self._request_hash(history + [{"role": "user", "content": text}]))
+            return await super().call_model_endpoint(serving_endpoint_name, text, provider_oauth_token, history,
+                                                     bot_conversation_id=bot_conversation_id, **kwargs)
+
+        async def call_genie_space(self, question, provider_oauth_token, conversation_id, genie_space_id,
+                                   bot_conversation_id=None, **kwargs):
+            self._take_record("call_genie_space", bot_conversation_id, question,
+                              self._request_hash({"question": question, "conversation_id": conversation_id}))
+            return await super().call_genie_space(question, provider_oauth_token, conversation_id, genie_space_id,
+                                                  bot_conversation_id=bot_conversation_id, **kwargs)
+
+        async def _call_model_endpoint(self, serving_endpoint_name, text, provider_oauth_token, history):
+            return await self._replay_response()
+
+        async def _call_genie_space(self, question, provider_oauth_token, conversation_id, genie_space_id):
+            return await self._replay_response()
+
+    outputs = defaultdict(list)
+
+    class CaptureOutgoingMiddleware(Middleware):
+        # Collects outgoing activities per incoming activity instead of sending them to Teams.
+        async def on_turn(self, context, logic):
+            async def capture(turn_context, activities, next_send):
+                outputs[turn_context.activity.id].extend(activity.serialize() for activity in activities)
+                return [ResourceResponse(id=str(uuid.uuid4())) for _ in activities]
+
+            context.on_send_activities(capture)
+            await logic()
+
+    async def get_user_token(turn_context, code=None):
+        return TokenResponse(connection_name=app.CONFIG.CONNECTION_NAME, token="replay-token")
+
+    async def has_logged_in(turn_context, default_value_or_factory=None):
+        return True
+
+    databricks_client = ReplayDatabricksClient(
+        [record for record in records if record["kind"] == "databricks"], app.SCHEDULER)
+    app.DIALOG.databricks_client = databricks_client
+    app.DIALOG.oauth_prompt.get_user_token = get_user_token
+    app.DIALOG.user_login_accessor.get = has_logged_in
+    app.DIALOG.warm_up_endpoint = lambda turn_context, provider_oauth_token=None: None
+    app.ADAPTER.use(CaptureOutgoingMiddleware())
+
+    recorded_latency = {record.get("activity_id"): record.get("duration_seconds")
+                        for record in records if record["kind"] == "incoming_done"}
+    incoming = [record for record in records if record["kind"] == "incoming"]
+    turns_by_conversation = defaultdict(list)
+    skipped = 0
+    for record in incoming:
+        activity = record["activity"]
+        # Sign-in invokes carry redacted tokens and cannot be replayed.
+        if (activity.get("name") or "").startswith("signin/"):
+            skipped += 1
+            continue
+        activity.setdefault("id", str(uuid.uuid4()))
+        conversation_id = (activity.get("conversation") or {}).get("id")
+        turns_by_conversation[conversation_id].append(record)
+
+    results = []
+    client = TestClient(TestServer(app.APP))
+    await client.start_server()
+    first_ts = incoming[0]["ts"] if incoming else 0
+    start = time.monotonic()
+
+    async def replay_conversation(conversation_records):
+        # Turns of one conversation are replayed in order; conversations run concurrently.
+        for record in conversation_records:
+            activity = record["activity"]
+            if speed > 0:
+                await asyncio.sleep(max(start + (record["ts"] - first_ts) / speed - time.monotonic(), 0))
+            sent = time.monotonic()
+            response = await client.post("/api/messages", json=activity)
+            await response.read()
+            results.append({
+                "activity_id": activity["id"],
+                "type": activity.get("type"),
+                "status": response.status,
+                "latency_seconds": time.monotonic() - sent,
+                "recorded_latency_seconds": recorded_latency.get(activity["id"]),
+                "outputs": [summarize_activity(output) for output in outputs[activity["id"]]],
+            })
+
+    try:
+        await asyncio.gather(*(replay_conversation(conversation_records)
+                               for conversation_records in turns_by_conversation.values()))
+    finally:
+        await client.close()
+
+    recorded = [result["recorded_latency_seconds"] for result in results
+                if result["recorded_latency_seconds"] is not None]
+    return {
+        "label": label,
+        "speed": speed,
+        "skipped": skipped,
+        "errors": sum(1 for result in results if result["status"] >= 400),
+        "request_mismatches": databricks_client.request_mismatches,
+        "latency": summarize_latencies([result["latency_seconds"] for result in results]),
+        "recorded_latency": summarize_latencies(recorded),
+        "turns": sorted(results, key=lambda result: result["activity_id"]),
+    }
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> int:
+    """Prints latency and output differences. Returns 1 if candidate p99 regressed beyond threshold."""
+    print(f"{'':8}{baseline['label']:>20}{candidate['label']:>20}{'change':>10}")
+    print(f"{'count':8}{baseline['latency']['count']:>20}{candidate['latency']['count']:>20}")
+    for stat in ("mean", "p50", "p90", "p99", "max"):
+        before = baseline["latency"].get(stat, 0)
+        after = candidate["latency"].get(stat, 0)
+        change = f"{(after - before) / before:+.1%}" if before else ""
+        print(f"{stat:8}{before:>20.4f}{after:>20.4f}{change:>10}")
+    print(f"{'errors':8}{baseline['errors']:>20}{candidate['errors']:>20}")
+    # Calls whose outbound messages differed from the capture; their outputs are not comparable.
+    print(f"{'changed':8}{len(baseline.get('request_mismatches', [])):>20}"
+          f"{len(candidate.get('request_mismatches', [])):>20}")
+
+    baseline_turns = {turn["activity_id"]: turn for turn in baseline["turns"]}
+    mismatches = [turn for turn in candidate["turns"]
+                  if turn["activity_id"] in baseline_turns
+                  and turn["outputs"] != baseline_turns[turn["activity_id"]]["outputs"]]
+    print(f"\n{len(mismatches)} of {len(candidate['turns'])} turns produced different outputs")
+    for turn in mismatches[:5]:
+        print(f"\n  {turn['activity_id']}:")
+        print(f"    {baseline['label']}: {json.dumps(baseline_turns[turn['activity_id']]['outputs'])}")
+        print(f"    {candidate['label']}: {json.dumps(turn['outputs'])}")
+
+    baseline_p99 = baseline["latency"].get("p99", 0)
+    if baseline_p99 and candidate["latency"].get("p99", 0) > baseline_p99 * (1 + threshold):
+        print(f"\np99 latency regressed by more than {threshold:.0%}")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Replay a capture and write a results file")
+    run_parser.add_argument("capture", nargs="+", help="Capture file(s), including rotated ones")
+    run_parser.add_argument("--speed", type=float, default=1.0,
+                            help="Time compression factor; 0 replays back to back (default: 1)")
+    run_parser.add_argument("--label", default="replay", help="Name of the build being replayed")
+    run_parser.add_argument("--out", required=True, help="Where to write the results JSON")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Allowed relative p99 latency increase (default: 0.1)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = asyncio.run(run_replay(load_capture(args.capture), args.speed, args.label))
+        with open(args.out, "w", encoding="utf-8") as out_file:
+            json.dump(results, out_file, indent=2, default=str)
+        print(f"Replayed {results['latency']['count']} turns ({results['skipped']} skipped, "
+              f"{results['errors']} errors, {len(results['request_mismatches'])} calls sent different "
+              f"messages than recorded). p50 {results['latency'].get('p50', 0):.4f}s, "
+              f"p99 {results['latency'].get('p99', 0):.4f}s")
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as baseline_file, \
+            open(args.candidate, encoding="utf-8") as candidate_file:
+        return compare(json.load(baseline_file), json.load(candidate_file), args.threshold)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import functools
+import hmac
+import logging
+import threading
+
+from aiohttp import web
+from aiohttp.web import Request, Response
+from botbuilder.core import MemoryStorage
+
+from .loop_monitor import LoopMonitor
+from .memory import MemoryTracker, largest_conversation_states
+from .profiler import SamplingProfiler
+
+MAX_PROFILE_SECONDS = 120
+MIN_PROFILE_INTERVAL_MS = 1
+
+
+def _admin_only(handler):
+    # Rejects requests without the admin bearer token and turns bad query parameters into 400s.
+    # Errors are answered here because aiohttp_error_middleware maps any raised exception to a 500.
+    @functools.wraps(handler)
+    async def wrapper(self, req: Request) -> Response:
+        if not self._is_authorized(req):
+            return Response(status=401)
+        try:
+            return await handler(self, req)
+        except ValueError as e:
+            return Response(status=400, text=str(e))
+    return wrapper
+
+
+class AdminRoutes:
+    """Admin-only diagnostics endpoints, protected by a bearer token.
+
+    Every diagnostic is off by default and only runs for the duration of a request
+    (or between explicit start/stop calls for tracemalloc).
+    """
+
+    def __init__(self, admin_token: str, storage: MemoryStorage, metrics_providers: dict = None):
+        # metrics_providers maps a name to a callable returning a JSON-serializable dict for /admin/metrics.
+        if not admin_token:
+            raise Exception("[AdminRoutes]: Missing parameter. admin_token is required")
+        self.admin_token = admin_token
+        self.storage = storage
+        self.metrics_providers = metrics_providers or {}
+        self.profiler = SamplingProfiler()
+        self.loop_monitor = LoopMonitor()
+        self.memory_tracker = MemoryTracker()
+
+    def register(self, app: web.Application):
+        app.router.add_get("/admin/profile", self.profile)
+        app.router.add_get("/admin/loop", self.loop_lag)
+        app.router.add_get("/admin/states", self.conversation_states)
+        app.router.add_get("/admin/metrics", self.metrics)
+        app.router.add_post("/admin/memory/start", self.memory_start)
+        app.router.add_get("/admin/memory/snapshot", self.memory_snapshot)
+        app.router.add_post("/admin/memory/stop", self.memory_stop)
+
+    def _is_authorized(self, req: Request) -> bool:
+        auth_header = req.headers.get("Authorization", "")
+        scheme, _, token = auth_header.partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.encode(), self.admin_token.encode())
+
+    @staticmethod
+    def _float_param(req: Request, name: str, default: float, maximum: float, minimum: float = None) -> float:
+        # Without a minimum the value only has to be above 0.
+        try:
+            value = float(req.query.get(name, default))
+        except ValueError:
+            raise ValueError(f"'{name}' must be a number")
+        if minimum is None and not 0 < value <= maximum:
+            raise ValueError(f"'{name}' must be between 0 and {maximum}")
+        if minimum is not None and not minimum <= value <= maximum:
+            raise ValueError(f"'{name}' must be between {minimum} and {maximum}")
+        return value
+
+    @_admin_only
+    async def profile(self, req: Request) -> Response:
+        # Samples the event-loop thread for N seconds and returns collapsed stacks for a flamegraph.
+        seconds = self._float_param(req, "seconds", 10, MAX_PROFILE_SECONDS)
+        # Shorter intervals make the sampling thread spin and starve the bot of the GIL.
+        interval = self._float_param(req, "interval_ms", 5, 1000, minimum=MIN_PROFILE_INTERVAL_MS) / 1000
+        if self.profiler.running:
+            return Response(status=409, text="A profile is already running.")
+
+        logging.info(f"Starting CPU profile for {seconds}s")
+        self.profiler.start(threading.get_ident(), interval)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            stacks = self.profiler.stop()
+        return Response(text=stacks, content_type="text/plain")
+
+    @_admin_only
+    async def loop_lag(self, req: Request) -> Response:
+        seconds = self._float_param(req, "seconds", 5, MAX_PROFILE_SECONDS)
+        slow_ms = self._float_param(req, "slow_ms", 100, 60000)
+        if self.loop_monitor.running:
+            return Response(status=409, text="A loop measurement is already running.")
+        report = await self.loop_monitor.measure(seconds, slow_callback_duration=slow_ms / 1000)
+        return web.json_response(report)
+
+    @_admin_only
+    async def conversation_states(self, req: Request) -> Response:
+        top = int(self._float_param(req, "top", 20, 1000))
+        return web.json_response(largest_conversation_states(self.storage, top))
+
+    @_admin_only
+    async def metrics(self, req: Request) -> Response:
+        return web.json_response({name: provider() for name, provider in self.metrics_providers.items()})
+
+    @_admin_only
+    async def memory_start(self, req: Request) -> Response:
+        self.memory_tracker.start()
+        return web.json_response({"tracing": True})
+
+    @_admin_only
+    async def memory_snapshot(self, req: Request) -> Response:
+        if not self.memory_tracker.tracing:
+            return Response(status=409, text="tracemalloc is not running. POST /admin/memory/start first.")
+        top = int(self._float_param(req, "top", 25, 1000))
+        return web.json_response(self.memory_tracker.snapshot(top))
+
+    @_admin_only
+    async def memory_stop(self, req: Request) -> Response:
+        self.memory_tracker.stop()
+        return web.json_response({"tracing": False})
@@ -28,7 +28,8 @@ class LogoutDialog(ComponentDialog):
 
     async def _interrupt(self, inner_dc: DialogContext):
         if inner_dc.context.activity.type == ActivityTypes.message:
-            text = inner_dc.context.activity.text.lower()
+            # Card submits such as "Next page" arrive as messages without text.
+            text = (inner_dc.context.activity.text or "").lower()
             if text == "logout":
                 user_token_client: UserTokenClient = inner_dc.context.turn_state.get(
                     UserTokenClient.__name__, None
@@ -1,44 +1,31 @@
 # Copyright © Databricks, Inc. All rights reserved.
 # Licensed under the MIT License.
 
-from botbuilder.core import UserState, ConversationState, CardFactory, MessageFactory
+from botbuilder.core import UserState, ConversationState, CardFactory, MessageFactory, TurnContext
 from botbuilder.dialogs import (
     WaterfallDialog,
     WaterfallStepContext,
 )
 from botbuilder.dialogs.prompts import OAuthPrompt, OAuthPromptSettings
+from botframework.connector.auth.user_token_client import UserTokenClient
 
+from cards import CardRenderer
 from client.databricks_client import DatabricksClient
+from client.endpoint_warmer import EndpointWarmer
+from client.scheduler import FairScheduler
 from dialogs import LogoutDialog
 import logging
 # Set the logging level to INFO
 logging.basicConfig(level=logging.INFO)
 
-tool_card_placeholder = {
-  "$schema": "http://adaptivecards.io/schemas/adaptive-card.json",
-  "type": "AdaptiveCard",
-  "version": "1.5",
-  "body": [
-    {
-      "type": "TextBlock",
-      "text": "Agent Tool Call",
-      "weight": "Bolder",
-      "size": "Medium"
-    },
-    {
-      "type": "FactSet",
-      "facts": [
-      ]
-    }
-  ]
-}
-
 class MainDialog(LogoutDialog):
     def __init__(self, connection_name: str,
                  databricks_host:str,
                  serving_endpoint_name: str,
                  user_state: UserState,
-                 conversation_state: ConversationState):
+                 conversation_state: ConversationState,
+                 scheduler: FairScheduler = None,
+                 recorder=None):
 
         # Initializes the MainDialog with OAuthPrompt and WaterfallDialog.
         super(MainDialog, self).__init__(MainDialog.__name__, connection_name)
@@ -60,8 +47,11 @@ class MainDialog(LogoutDialog):
                     timeout=300000
                 )
             )
-        self.databricks_client = DatabricksClient(databricks_host)
+        self.databricks_client = DatabricksClient(databricks_host, scheduler=scheduler, recorder=recorder)
         self.serving_endpoint_name = serving_endpoint_name
+        self.card_renderer = CardRenderer()
+        self.endpoint_warmer = EndpointWarmer(self.databricks_client)
+        self.databricks_client.endpoint_call_listeners.append(self.endpoint_warmer.record_call)
 
         self.add_dialog(self.oauth_prompt)
 
@@ -77,15 +67,61 @@ class MainDialog(LogoutDialog):
 
         self.initial_dialog_id = "WFDialog"
 
-    def create_tool_call_card(self, tool_call_info):
-
-        tool_card = tool_card_placeholder.copy()
-
-        tool_card["body"][1]["facts"] = [{ "title": "Tool", "value": tool_call_info["name"]},
-        { "title": "Params", "value": tool_call_info["arguments"]},
-        { "title": "Result", "value": tool_call_info["output"] }]
+    def warm_up_endpoint(self, turn_context: TurnContext, provider_oauth_token: str = None):
+        # Starts a background warm-up of the serving endpoint for a user who is about to chat.
+        if provider_oauth_token:
+            async def token_provider():
+                return provider_oauth_token
+        else:
+            # Capture what is needed to look up the user's token, as the turn may be over when it runs.
+            user_token_client: UserTokenClient = turn_context.turn_state.get(UserTokenClient.__name__, None)
+            if user_token_client is None:
+                return
+            user_id = turn_context.activity.from_property.id
+            channel_id = turn_context.activity.channel_id
+
+            async def token_provider():
+                token_response = await user_token_client.get_user_token(user_id, self.connection_name,
+                                                                        channel_id, None)
+                return token_response.token if token_response else None
+
+        self.endpoint_warmer.schedule(self.serving_endpoint_name, token_provider)
+
+    @staticmethod
+    def get_scheduling_key(turn_context: TurnContext):
+        # Returns (tenant_id, user_id, priority) used to queue this turn's outbound calls fairly.
+        activity = turn_context.activity
+        conversation = activity.conversation
+        tenant_id = getattr(conversation, "tenant_id", None)
+        if not tenant_id and isinstance(activity.channel_data, dict):
+            tenant_id = (activity.channel_data.get("tenant") or {}).get("id")
+        user_id = getattr(activity.from_property, "aad_object_id", None) or activity.from_property.id
+        if getattr(conversation, "conversation_type", None) == "personal":
+            priority = FairScheduler.PERSONAL
+        else:
+            priority = FairScheduler.CHANNEL
+        return tenant_id, user_id, priority
 
-        return tool_card
+    def create_tool_call_card(self, tool_call_info):
+        return self.card_renderer.render_tool_call_card(tool_call_info)
+
+    async def send_tabular_result(self, dc_context, title, result):
+        # Sends a tabular Genie or tool result as a paged table card. Returns False if it is not tabular.
+        table = CardRenderer.parse_table(result)
+        if table is None:
+            return False
+        columns, rows = table
+        card = self.card_renderer.render_table(dc_context.activity.conversation.id, title, columns, rows)
+        await dc_context.send_activity(MessageFactory.attachment(CardFactory.adaptive_card(card)))
+        return True
+
+    async def send_result_page(self, dc_context, page_request):
+        # Serves a "next page" submit from the server-side result cursor.
+        card = self.card_renderer.render_result_page(dc_context.activity.conversation.id, *page_request)
+        if card is None:
+            await dc_context.send_activity("This result has expired. Please ask your question again.")
+            return
+        await dc_context.send_activity(MessageFactory.attachment(CardFactory.adaptive_card(card)))
 
     async def ensure_signin_step(self, step_context: WaterfallStepContext):
         # Try to retrieve the token
@@ -117,9 +153,14 @@ class MainDialog(LogoutDialog):
                 tool_info = {"name": tool_call["function"]["name"],
                              "arguments": tool_call["function"]["arguments"],
                              "output": item["content"]}
+                table = CardRenderer.parse_table(item["content"])
+                if table is not None:
+                    tool_info["output"] = f"{len(table[1])} rows (shown below)"
                 activity = MessageFactory.attachment(
                     CardFactory.adaptive_card(self.create_tool_call_card(tool_info)))
                 await dc_context.send_activity(activity)
+                if table is not None:
+                    await self.send_tabular_result(dc_context, f"{tool_info['name']} result", item["content"])
         return new_history
 
     async def api_call_step(self, step_context: WaterfallStepContext):
@@ -129,18 +170,31 @@ class MainDialog(LogoutDialog):
             # Set flag after first login completes
             await self.user_login_accessor.set(step_context.context, True)
 
+            self.warm_up_endpoint(step_context.context, str(token_response.token))
             await step_context.context.send_activity("You are now logged in.")
             # Do NOT call API on first login
             return await step_context.end_dialog()
         elif token_response and token_response.token:
+            # "Next page" Action.Submit messages carry the cursor in activity.value and have no text,
+            # so this check must stay ahead of anything that reads activity.text (such as .lower()).
+            page_request = CardRenderer.get_page_request(step_context.context.activity.value)
+            if page_request:
+                await self.send_result_page(step_context.context, page_request)
+                return await step_context.end_dialog()
             try:
                 # Call Databricks agent API.
                 input_text = step_context.context.activity.text.lower()
                 actual_history = await self.history.get(step_context.context, default_value_or_factory=list)
+                tenant_id, user_id, priority = self.get_scheduling_key(step_context.context)
+                conversation_id = step_context.context.activity.conversation.id
                 response = await self.databricks_client.call_model_endpoint(self.serving_endpoint_name,
                                                                             input_text,
                                                                             str(token_response.token),
-                                                                            actual_history)
+                                                                            actual_history,
+                                                                            tenant_id=tenant_id,
+                                                                            user_id=user_id,
+                                                                            priority=priority,
+                                                                            bot_conversation_id=conversation_id)
                 new_history = await self.send_response_activities(input_text,
                                                                   response,
                                                                   actual_history,
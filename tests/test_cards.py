@@ -0,0 +1,148 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import json
+import unittest
+from unittest import mock
+
+from cards import CardRenderer, ResultCursorStore
+
+
+def table_rows(card):
+    # Returns the text of each table row in a card, header row first.
+    table = card["body"][1]
+    return [[cell["items"][0]["text"] for cell in row["cells"]] for row in table["rows"]]
+
+
+class ParseTableTest(unittest.TestCase):
+    def test_markdown_table(self):
+        columns, rows = CardRenderer.parse_table("| a | b |\n|---|:-:|\n| 1 | 2 |\n| 3 | 4 |")
+        self.assertEqual(columns, ["a", "b"])
+        self.assertEqual(rows, [["1", "2"], ["3", "4"]])
+
+    def test_markdown_ragged_rows_are_kept(self):
+        columns, rows = CardRenderer.parse_table("| a | b |\n|---|---|\n| x|y | z |\n| only |")
+        self.assertEqual(columns, ["a", "b"])
+        self.assertEqual(rows, [["x", "y"], ["only", ""]])
+
+    def test_json_records(self):
+        columns, rows = CardRenderer.parse_table(json.dumps([{"a": 1}, {"a": 2, "b": "x"}]))
+        self.assertEqual(columns, ["a", "b"])
+        self.assertEqual(rows, [["1", ""], ["2", "x"]])
+
+    def test_json_columns_and_ragged_data(self):
+        columns, rows = CardRenderer.parse_table(json.dumps({"columns": ["a", "b"],
+                                                             "data": [["1"], ["1", "2", "3"], 4]}))
+        self.assertEqual(columns, ["a", "b"])
+        self.assertEqual(rows, [["1", ""], ["1", "2"], ["4", ""]])
+
+    def test_non_tabular_results(self):
+        for result in ("plain text", "| not a table", "[1, 2]", "{broken", None, 42):
+            self.assertIsNone(CardRenderer.parse_table(result), result)
+
+
+class RenderTableTest(unittest.TestCase):
+    def test_pages_through_rows(self):
+        renderer = CardRenderer(rows_per_page=10)
+        rows = [[str(index), "x"] for index in range(25)]
+        card = renderer.render_table("conversation", "Title", ["n", "x"], rows)
+
+        seen = []
+        while True:
+            seen.extend(row[0] for row in table_rows(card)[1:])
+            page_request = CardRenderer.get_page_request(card["actions"][0]["data"]) if card["actions"] else None
+            if page_request is None:
+                break
+            card = renderer.render_result_page("conversation", *page_request)
+
+        self.assertEqual(seen, [str(index) for index in range(25)])
+        self.assertEqual(card["body"][2]["text"], "Rows 21-25 of 25")
+
+    def test_large_cells_stay_under_limit(self):
+        renderer = CardRenderer(max_card_bytes=24000)
+        rows = [["é" * 2000, "\"" * 2000] for _ in range(30)]
+        card = renderer.render_table("conversation", "Title", ["a", "b"], rows)
+        self.assertLessEqual(renderer._card_size(card), 24000)
+        self.assertEqual(len(card["actions"]), 1)
+
+    def test_wide_result_is_split_into_column_bands(self):
+        renderer = CardRenderer(max_card_bytes=24000)
+        columns = [f"column_{index}" for index in range(400)]
+        rows = [[json.dumps({"key": "v" * 50})] * 400 for _ in range(5)]
+        card = renderer.render_table("conversation", "Wide", columns, rows)
+
+        shown = set()
+        pages = 1
+        while True:
+            self.assertLessEqual(renderer._card_size(card), 24000)
+            shown.update(table_rows(card)[0])
+            if not card["actions"]:
+                break
+            card = renderer.render_result_page("conversation",
+                                               *CardRenderer.get_page_request(card["actions"][0]["data"]))
+            pages += 1
+
+        self.assertEqual(shown, set(columns))
+        self.assertGreater(pages, 5)
+
+    def test_too_wide_for_one_column_sends_notice(self):
+        renderer = CardRenderer(max_card_bytes=600)
+        card = renderer.render_table("conversation", "Title", ["a"], [["x" * 5000]])
+        self.assertLessEqual(renderer._card_size(card), 600)
+        self.assertIn("too wide", card["body"][-1]["text"])
+        self.assertEqual(card["actions"], [])
+
+    def test_page_of_another_conversation_is_refused(self):
+        renderer = CardRenderer(rows_per_page=1)
+        card = renderer.render_table("conversation", "Title", ["a"], [["1"], ["2"]])
+        page_request = CardRenderer.get_page_request(card["actions"][0]["data"])
+        self.assertIsNone(renderer.render_result_page("other", *page_request))
+        self.assertIsNotNone(renderer.render_result_page("conversation", *page_request))
+
+
+class RenderToolCallCardTest(unittest.TestCase):
+    def test_small_values_are_kept(self):
+        card = CardRenderer().render_tool_call_card({"name": "lookup", "arguments": "{}", "output": "42"})
+        self.assertEqual([fact["value"] for fact in card["body"][1]["facts"]], ["lookup", "{}", "42"])
+
+    def test_large_params_and_result_stay_under_limit(self):
+        renderer = CardRenderer(max_card_bytes=24000)
+        card = renderer.render_tool_call_card({"name": "lookup",
+                                               "arguments": json.dumps({"query": "\"q\"" * 20000}),
+                                               "output": "é" * 50000})
+        facts = card["body"][1]["facts"]
+        self.assertLessEqual(renderer._card_size(card), 24000)
+        self.assertEqual(facts[0]["value"], "lookup")
+        self.assertTrue(facts[1]["value"].endswith("…"))
+        self.assertTrue(facts[2]["value"].endswith("…"))
+
+
+class ResultCursorStoreTest(unittest.TestCase):
+    def test_cursor_is_scoped_to_its_conversation(self):
+        store = ResultCursorStore()
+        cursor_id = store.create("conversation", "Title", ["a"], [["1"]])
+        self.assertIsNone(store.get(cursor_id, "other"))
+        self.assertEqual(store.get(cursor_id, "conversation")["rows"], [["1"]])
+        self.assertIsNone(store.get("unknown", "conversation"))
+
+    def test_cursor_expires(self):
+        store = ResultCursorStore(ttl_seconds=60)
+        with mock.patch("cards.result_cursor.time.monotonic", return_value=1000.0):
+            cursor_id = store.create("conversation", "Title", ["a"], [["1"]])
+        with mock.patch("cards.result_cursor.time.monotonic", return_value=1059.0):
+            self.assertIsNotNone(store.get(cursor_id, "conversation"))
+        with mock.patch("cards.result_cursor.time.monotonic", return_value=1061.0):
+            self.assertIsNone(store.get(cursor_id, "conversation"))
+        self.assertEqual(len(store), 0)
+
+    def test_least_recently_used_cursor_is_evicted(self):
+        store = ResultCursorStore(max_cursors=2)
+        first = store.create("conversation", "First", ["a"], [])
+        second = store.create("conversation", "Second", ["a"], [])
+        store.get(first, "conversation")
+        third = store.create("conversation", "Third", ["a"], [])
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get(second, "conversation"))
+        self.assertIsNotNone(store.get(first, "conversation"))
+        self.assertIsNotNone(store.get(third, "conversation"))
@@ -0,0 +1,89 @@
+# Copyright © Databricks, Inc. All rights reserved.
+# Licensed under the MIT License.
+
+import asyncio
+import unittest
+
+from client.scheduler import FairScheduler
+
+
+class FairSchedulerTest(unittest.IsolatedAsyncioTestCase):
+    async def test_light_user_is_not_queued_behind_heavy_user(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        order = []
+
+        async def call(user_id):
+            async with scheduler.slot("tenant", user_id, FairScheduler.PERSONAL):
+                order.append(user_id)
+                await asyncio.sleep(0.01)
+
+        heavy = [asyncio.create_task(call("heavy")) for _ in range(10)]
+        await asyncio.sleep(0)
+        light = [asyncio.create_task(call("light")) for _ in range(2)]
+        await asyncio.gather(*heavy, *light)
+
+        # Both light calls run long before the heavy user's backlog is drained.
+        self.assertLess(max(index for index, user_id in enumerate(order) if user_id == "light"), 6)
+
+    async def test_cancelled_calls_do_not_count_against_user(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        order = []
+        release = asyncio.Event()
+
+        async def call(user_id):
+            async with scheduler.slot("tenant", user_id, FairScheduler.PERSONAL):
+                order.append(user_id)
+                if user_id == "blocker":
+                    await release.wait()
+
+        blocker = asyncio.create_task(call("blocker"))
+        await asyncio.sleep(0)
+        timed_out = [asyncio.create_task(call("timed-out")) for _ in range(5)]
+        await asyncio.sleep(0)
+        for task in timed_out:
+            task.cancel()
+        await asyncio.gather(*timed_out, return_exceptions=True)
+
+        retry = asyncio.create_task(call("timed-out"))
+        await asyncio.sleep(0)
+        other = asyncio.create_task(call("other"))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, retry, other)
+
+        # The retry was queued first and its user has not been served, so it goes first.
+        self.assertEqual(order, ["blocker", "timed-out", "other"])
+
+    async def test_channel_mention_is_not_starved_by_personal_chats(self):
+        scheduler = FairScheduler(max_concurrency=1)
+        stop = asyncio.Event()
+        order = []
+
+        async def busy_personal_user(user_id):
+            while not stop.is_set():
+                async with scheduler.slot("tenant", user_id, FairScheduler.PERSONAL):
+                    order.append(user_id)
+                    await asyncio.sleep(0.01)
+
+        personal = [asyncio.create_task(busy_personal_user(f"user-{index}")) for index in range(3)]
+        await asyncio.sleep(0.05)
+
+        async def channel_mention():
+            async with scheduler.slot("tenant", "channel-user", FairScheduler.CHANNEL):
+                order.append("channel")
+
+        enqueued_at = len(order)
+        try:
+            # Under strict priority this never completes; the timeout only keeps the suite from hanging.
+            await asyncio.wait_for(channel_mention(), timeout=5)
+        finally:
+            stop.set()
+
+        await asyncio.gather(*personal)
+        # With a 4:1 share the mention waits for a handful of personal calls, not for all of them.
+        self.assertLessEqual(order.index("channel") - enqueued_at, 5)
+        self.assertEqual(scheduler.metrics()["classes"]["channel"]["dispatched"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()